@@ -24,7 +24,17 @@ import pandas as pd
 import geopandas as gpd
 from functools import reduce
 import requests, zipfile, io
+from concurrent.futures import ThreadPoolExecutor
 import math
+import time
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import json
+
+# set to True to time the old steps against their replacements
+run_benchmarks = False
 
 
 #%%
@@ -36,78 +46,155 @@ import math
 import warnings
 warnings.filterwarnings("ignore")
 
-# education
-acs_b15003 = pd.read_csv('EDUCATION/B15003_EDUCATIONAL_ATTAINMENT/ACSDT5Y2021.B15003-Data.csv')
-
-# poverty
-acs_c17002 = pd.read_csv('EMPLOYMENT_INCOME/C17002_RATIO_INCOMExPOVERTY/ACSDT5Y2021.C17002-Data.csv')
-
-# government programs
-acs_b19058 = pd.read_csv('GOVERNMENT_PROGRAMS/B19058_PUBLIC_ASSISTANCE_SNAP/ACSDT5Y2021.B19058-Data.csv')
-acs_b27010 = pd.read_csv('GOVERNMENT_PROGRAMS/B27010_HEALTH_INSURANCExAGE/ACSDT5Y2021.B27010-Data.csv')
-
-# housing
-acs_b11012 = pd.read_csv('HOUSING/B11012_HOUSEHOLDSxTYPE/ACSDT5Y2021.B11012-Data.csv')
-acs_b25009 = pd.read_csv('HOUSING/B25009_TENURExHOUSEHOLD_SIZE/ACSDT5Y2021.B25009-Data.csv')
-acs_b25024 = pd.read_csv('HOUSING/B25024_UNITS_IN_STRUCTURE/ACSDT5Y2021.B25024-Data.csv')
-acs_b25047 = pd.read_csv('HOUSING/B25047_PLUMBING_FACILITIES/ACSDT5Y2021.B25047-Data.csv')
-acs_b25070 = pd.read_csv('HOUSING/B25070_GROSS_RENT_AS_PCT_HOUSEHOLD_INCOME/ACSDT5Y2021.B25070-Data.csv')
-
-# technology
-acs_b28001 = pd.read_csv('TECHNOLOGY/B28001_COMPUTERS/ACSDT5Y2021.B28001-Data.csv')
-acs_b28002 = pd.read_csv('TECHNOLOGY/B28002_INTERNET/ACSDT5Y2021.B28002-Data.csv')
-
-
-#%%
-
-
-### 2. select relevant columns & combine all census data
+# columns we use from each table
+acs_columns = {
+    # education
+    'B15003' : ['GEO_ID', 'NAME', 'B15003_001E', 'B15003_001M', 'B15003_002E',
+                'B15003_002M', 'B15003_003E', 'B15003_003M', 'B15003_004E',
+                'B15003_004M', 'B15003_005E', 'B15003_005M', 'B15003_006E',
+                'B15003_006M', 'B15003_007E', 'B15003_007M', 'B15003_008E',
+                'B15003_008M', 'B15003_009E', 'B15003_009M', 'B15003_010E',
+                'B15003_010M', 'B15003_011E', 'B15003_011M', 'B15003_012E',
+                'B15003_012M', 'B15003_013E', 'B15003_013M', 'B15003_014E',
+                'B15003_014M', 'B15003_015E', 'B15003_015M', 'B15003_016E',
+                'B15003_016M', 'B15003_017E', 'B15003_017M', 'B15003_018E',
+                'B15003_018M', 'B15003_019E', 'B15003_019M', 'B15003_020E',
+                'B15003_020M', 'B15003_021E', 'B15003_021M', 'B15003_022E',
+                'B15003_022M', 'B15003_023E', 'B15003_023M', 'B15003_024E',
+                'B15003_024M', 'B15003_025E', 'B15003_025M'],
+    # poverty
+    'C17002' : ['GEO_ID', 'NAME','C17002_001E','C17002_001M','C17002_002E','C17002_002M',
+                'C17002_003E', 'C17002_003M', 'C17002_004E', 'C17002_004M', 
+                'C17002_005E', 'C17002_005M', 'C17002_006E', 'C17002_006M', 
+                'C17002_007E', 'C17002_007M', 'C17002_008E', 'C17002_008M'],
+    # government programs
+    'B19058' : ['GEO_ID', 'NAME', 'B19058_001E', 'B19058_001M', 'B19058_002E', 'B19058_002M'],
+    'B27010' : ['GEO_ID', 'NAME', 'B27010_002E', 'B27010_006E', 'B27010_007E', 'B27010_013E',
+                'B27010_017E', 'B27010_002M', 'B27010_006M', 'B27010_007M',
+                'B27010_013M', 'B27010_017M', 'B27010_001E', 'B27010_055E',
+                'B27010_062E', 'B27010_066E', 'B27010_001M', 'B27010_055M', 
+                'B27010_062M', 'B27010_066M', 'B27010_051E','B27010_033E',
+                'B27010_050E', 'B27010_051M', 'B27010_033M', 'B27010_050M'],
+    # housing
+    'B11012' : ['GEO_ID', 'NAME','B11012_001E', 'B11012_008E', 'B11012_013E', 'B11012_001M',
+                'B11012_008M', 'B11012_013M'],
+    'B25009' : ['GEO_ID', 'NAME','B25009_001E', 'B25009_010E', 'B25009_001M', 'B25009_010M'],
+    'B25024' : ['GEO_ID', 'NAME','B25024_010E', 'B25024_001E', 'B25024_010M', 'B25024_001M'],
+    'B25047' : ['GEO_ID', 'NAME','B25047_001E', 'B25047_003E', 'B25047_001M', 'B25047_003M'],
+    'B25070' : ['GEO_ID', 'NAME','B25070_001E', 'B25070_007E', 'B25070_008E', 'B25070_009E',
+                'B25070_010E', 'B25070_001M', 'B25070_007M', 'B25070_008M',
+                'B25070_009M', 'B25070_010M'],
+    # technology
+    'B28001' : ['GEO_ID', 'NAME','B28001_001E', 'B28001_011E', 'B28001_001M', 'B28001_011M'],
+    'B28002' : ['GEO_ID', 'NAME','B28002_001E', 'B28002_013E', 'B28002_001M', 'B28002_013M']}
+
+# clean acs data with jam values while reading
+# source: https://www.census.gov/programs-surveys/acs/technical-documentation/code-lists.html "jam values"
+acs_jam_values = {
+    # - : margin of error for median > median
+    '-': np.nan,
+    # N : data can't be displayed because there were an insufficient number of samples
+    'N': np.nan,
+    # (X) : data isn't applicable or isn't available
+    '(X)': np.nan,
+    # ** : the margin of error could not be computed because there weren't enough samples
+    '**': np.nan,
+    # ***** : margin of error isn't appropriate because the measure corresponds to a single measure
+    # effectively, the margin of error should be treated as 0
+    '*****': 0}
+
+# replace jam values and convert to float in one pass per column
+# each column is factorized once, so only its distinct values are checked against the
+# jam codes and parsed as numbers, then mapped back to the rows
+# returns the cleaned df and the count of each jam code per column (for QA)
+def clean_jam_values(df, columns):
+    cleaned = {}
+    counts = {}
+    jam_codes = list(acs_jam_values)
+    for col in columns:
+        codes, uniques = pd.factorize(df[col])
+        uniques = pd.Series(uniques, dtype=object)
+        is_jam = uniques.isin(jam_codes).to_numpy()
+        values = np.array(pd.to_numeric(uniques.where(~is_jam)), dtype=float)
+        values[is_jam] = uniques[is_jam].map(acs_jam_values).to_numpy(dtype=float)
+        # code -1 (missing) takes the NaN appended at the end
+        cleaned[col] = np.append(values, np.nan)[codes]
+        unique_counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        counts[col] = pd.Series(unique_counts[is_jam], index=uniques[is_jam].to_numpy())
+    jam_counts = pd.DataFrame(counts).T.reindex(columns=jam_codes).fillna(0).astype(int)
+    return df.assign(**cleaned), jam_counts
+
+# read only the columns we use, skip the description row (2nd line) and return
+# the estimates/moes as floats, with the jam value counts of the table
+def read_acs_table(path, columns):
+    table = pacsv.read_csv(path,
+                           read_options=pacsv.ReadOptions(skip_rows_after_names=1),
+                           convert_options=pacsv.ConvertOptions(
+                               include_columns=columns,
+                               column_types={col: pa.string() for col in columns}))
+    return clean_jam_values(table.to_pandas(), columns[2:])
+
+acs_paths = {
+    # education
+    'B15003' : 'EDUCATION/B15003_EDUCATIONAL_ATTAINMENT/ACSDT5Y2021.B15003-Data.csv',
+    # poverty
+    'C17002' : 'EMPLOYMENT_INCOME/C17002_RATIO_INCOMExPOVERTY/ACSDT5Y2021.C17002-Data.csv',
+    # government programs
+    'B19058' : 'GOVERNMENT_PROGRAMS/B19058_PUBLIC_ASSISTANCE_SNAP/ACSDT5Y2021.B19058-Data.csv',
+    'B27010' : 'GOVERNMENT_PROGRAMS/B27010_HEALTH_INSURANCExAGE/ACSDT5Y2021.B27010-Data.csv',
+    # housing
+    'B11012' : 'HOUSING/B11012_HOUSEHOLDSxTYPE/ACSDT5Y2021.B11012-Data.csv',
+    'B25009' : 'HOUSING/B25009_TENURExHOUSEHOLD_SIZE/ACSDT5Y2021.B25009-Data.csv',
+    'B25024' : 'HOUSING/B25024_UNITS_IN_STRUCTURE/ACSDT5Y2021.B25024-Data.csv',
+    'B25047' : 'HOUSING/B25047_PLUMBING_FACILITIES/ACSDT5Y2021.B25047-Data.csv',
+    'B25070' : 'HOUSING/B25070_GROSS_RENT_AS_PCT_HOUSEHOLD_INCOME/ACSDT5Y2021.B25070-Data.csv',
+    # technology
+    'B28001' : 'TECHNOLOGY/B28001_COMPUTERS/ACSDT5Y2021.B28001-Data.csv',
+    'B28002' : 'TECHNOLOGY/B28002_INTERNET/ACSDT5Y2021.B28002-Data.csv'}
+
+# compare reading the full files with the pruned, typed reader
+if run_benchmarks:
+    for table_id, path in acs_paths.items():
+        start = time.perf_counter()
+        full = pd.read_csv(path)
+        full_time = time.perf_counter() - start
+        full_mb = full.memory_usage(deep=True).sum() / 1e6
+        del full
+        start = time.perf_counter()
+        pruned = read_acs_table(path, acs_columns[table_id])[0]
+        pruned_time = time.perf_counter() - start
+        pruned_mb = pruned.memory_usage(deep=True).sum() / 1e6
+        del pruned
+        print('%s: %.1f s -> %.1f s, %.0f MB -> %.0f MB (%.0f MB saved)'
+              % (table_id, full_time, pruned_time, full_mb, pruned_mb, full_mb - pruned_mb))
+
+acs_tables = {}
+acs_jam_counts = []
+for table_id, path in acs_paths.items():
+    acs_tables[table_id], jam_counts = read_acs_table(path, acs_columns[table_id])
+    acs_jam_counts.append(jam_counts)
+acs_jam_counts = pd.concat(acs_jam_counts)
 
 # education
-acs_b15003 = acs_b15003[['GEO_ID', 'NAME', 'B15003_001E', 'B15003_001M', 'B15003_002E',
-                     'B15003_002M', 'B15003_003E', 'B15003_003M', 'B15003_004E',
-                     'B15003_004M', 'B15003_005E', 'B15003_005M', 'B15003_006E',
-                     'B15003_006M', 'B15003_007E', 'B15003_007M', 'B15003_008E',
-                     'B15003_008M', 'B15003_009E', 'B15003_009M', 'B15003_010E',
-                     'B15003_010M', 'B15003_011E', 'B15003_011M', 'B15003_012E',
-                     'B15003_012M', 'B15003_013E', 'B15003_013M', 'B15003_014E',
-                     'B15003_014M', 'B15003_015E', 'B15003_015M', 'B15003_016E',
-                     'B15003_016M', 'B15003_017E', 'B15003_017M', 'B15003_018E',
-                     'B15003_018M', 'B15003_019E', 'B15003_019M', 'B15003_020E',
-                     'B15003_020M', 'B15003_021E', 'B15003_021M', 'B15003_022E',
-                     'B15003_022M', 'B15003_023E', 'B15003_023M', 'B15003_024E',
-                     'B15003_024M', 'B15003_025E', 'B15003_025M']]
+acs_b15003 = acs_tables['B15003']
 
 # poverty
-acs_c17002 = acs_c17002[['GEO_ID', 'NAME','C17002_001E','C17002_001M','C17002_002E','C17002_002M',
-                         'C17002_003E', 'C17002_003M', 'C17002_004E', 'C17002_004M', 
-                         'C17002_005E', 'C17002_005M', 'C17002_006E', 'C17002_006M', 
-                         'C17002_007E', 'C17002_007M', 'C17002_008E', 'C17002_008M']]
+acs_c17002 = acs_tables['C17002']
 
 # government programs
-acs_b19058 = acs_b19058[['GEO_ID', 'NAME', 'B19058_001E', 'B19058_001M', 'B19058_002E', 'B19058_002M']]
-
-
-acs_b27010 = acs_b27010[['GEO_ID', 'NAME', 'B27010_002E', 'B27010_006E', 'B27010_007E', 'B27010_013E',
-                         'B27010_017E', 'B27010_002M', 'B27010_006M', 'B27010_007M',
-                         'B27010_013M', 'B27010_017M', 'B27010_001E', 'B27010_055E',
-                         'B27010_062E', 'B27010_066E', 'B27010_001M', 'B27010_055M', 
-                         'B27010_062M', 'B27010_066M', 'B27010_051E','B27010_033E',
-                         'B27010_050E', 'B27010_051M', 'B27010_033M', 'B27010_050M']]
+acs_b19058 = acs_tables['B19058']
+acs_b27010 = acs_tables['B27010']
 
 # housing
-acs_b11012 = acs_b11012[['GEO_ID', 'NAME','B11012_001E', 'B11012_008E', 'B11012_013E', 'B11012_001M',
-                         'B11012_008M', 'B11012_013M']]
-acs_b25009 = acs_b25009[['GEO_ID', 'NAME','B25009_001E', 'B25009_010E', 'B25009_001M', 'B25009_010M']]
-acs_b25024 = acs_b25024[['GEO_ID', 'NAME','B25024_010E', 'B25024_001E', 'B25024_010M', 'B25024_001M']]
-acs_b25047 = acs_b25047[['GEO_ID', 'NAME','B25047_001E', 'B25047_003E', 'B25047_001M', 'B25047_003M']]
-acs_b25070 = acs_b25070[['GEO_ID', 'NAME','B25070_001E', 'B25070_007E', 'B25070_008E', 'B25070_009E',
-                         'B25070_010E', 'B25070_001M', 'B25070_007M', 'B25070_008M',
-                         'B25070_009M', 'B25070_010M']]
+acs_b11012 = acs_tables['B11012']
+acs_b25009 = acs_tables['B25009']
+acs_b25024 = acs_tables['B25024']
+acs_b25047 = acs_tables['B25047']
+acs_b25070 = acs_tables['B25070']
 
 # technology
-acs_b28001 = acs_b28001[['GEO_ID', 'NAME','B28001_001E', 'B28001_011E', 'B28001_001M', 'B28001_011M']]
-acs_b28002 = acs_b28002[['GEO_ID', 'NAME','B28002_001E', 'B28002_013E', 'B28002_001M', 'B28002_013M']]
+acs_b28001 = acs_tables['B28001']
+acs_b28002 = acs_tables['B28002']
 
 
 #%%
@@ -115,15 +202,37 @@ acs_b28002 = acs_b28002[['GEO_ID', 'NAME','B28002_001E', 'B28002_013E', 'B28002_
 
 ### 2. combine all census data
 
-# make list of all census dataframes
-dfs = [acs_b15003,
-       acs_c17002,
-       acs_b19058, acs_b27010,
-       acs_b11012, acs_b25009, acs_b25024, acs_b25047, acs_b25070,
-       acs_b28001, acs_b28002]
-
-# merge
-acs = reduce(lambda left,right: pd.merge(left,right,on=['GEO_ID', 'NAME'], how='outer'), dfs)
+# index each table once by the integer block group id (the 12 digits after '1500000US' in GEO_ID,
+# as int to get rid of leading 0s), the same ID ejscreen uses
+def acs_id_index(df):
+    return df.set_index(df['GEO_ID'].str[9:].astype('int64').rename('ID'))
+
+acs_indexed = {table_id: acs_id_index(df) for table_id, df in acs_tables.items()}
+
+# line all tables up on the index in one concat (instead of merging them one by one on the GEO_ID/NAME strings)
+# GEO_ID and NAME come from the first table that has the block group
+acs_names = pd.concat([df[['GEO_ID', 'NAME']] for df in acs_indexed.values()])
+acs = acs_names[~acs_names.index.duplicated()].join(
+    pd.concat([df.drop(columns=['GEO_ID', 'NAME']) for df in acs_indexed.values()], axis=1, join='outer'))
+
+# report block groups missing from any table
+in_table = pd.DataFrame({table_id: acs.index.isin(df.index) for table_id, df in acs_indexed.items()}, index=acs.index)
+missing = in_table[~in_table.all(axis=1)]
+print(str(len(missing)) + " block groups are missing from at least one ACS table")
+if len(missing):
+    print((~missing).sum()[lambda counts: counts > 0])
+
+# compare with the old merge of the tables one by one
+if run_benchmarks:
+    start = time.perf_counter()
+    reduce(lambda left,right: pd.merge(left,right,on=['GEO_ID', 'NAME'], how='outer'), acs_tables.values())
+    merge_time = time.perf_counter() - start
+    start = time.perf_counter()
+    acs_indexed = {table_id: acs_id_index(df) for table_id, df in acs_tables.items()}
+    acs_names = pd.concat([df[['GEO_ID', 'NAME']] for df in acs_indexed.values()])
+    acs_names[~acs_names.index.duplicated()].join(
+        pd.concat([df.drop(columns=['GEO_ID', 'NAME']) for df in acs_indexed.values()], axis=1, join='outer'))
+    print('acs merge: %.1f s -> %.1f s' % (merge_time, time.perf_counter() - start))
 
 
 #%%
@@ -131,8 +240,7 @@ acs = reduce(lambda left,right: pd.merge(left,right,on=['GEO_ID', 'NAME'], how='
 
 ### 3. clean census data
 
-# delete first row
-acs = acs.iloc[1:]
+# (the description row was already skipped by read_acs_table)
 
 # split name column into many columns
 acs[['Block_Group', 'Census_Tract', 'County', 'State']] = acs['NAME'].str.split(', ', expand=True)
@@ -145,18 +253,81 @@ acs['Census_Tract'] = acs.Census_Tract.str[13:]
 acs = acs[acs.State != 'Hawaii']
 acs = acs[acs.State != 'Puerto Rico']
 
-# make ID column since acs's geoid column is the full reference and we only want the 9-digit reference to merge on
-acs['ID'] = acs.GEO_ID.str[9:]
-
-# change type to int to get rid of leading 0s
-acs['ID'] = acs['ID'].astype(int)
+# (the ID to merge on is already the index, set by acs_id_index)
 
 
 #%%
 
 
 ### 4. import ejscreen data
-ejscreen = pd.read_csv('EJSCREEN_2023_BG_with_AS_CNMI_GU_VI.csv', encoding='utf-8', encoding_errors='ignore')
+
+ejscreen_path = 'EJSCREEN_2023_BG_with_AS_CNMI_GU_VI.csv'
+# the filtered, pruned ejscreen data is cached as parquet for later runs
+ejscreen_cache = 'CACHE/ejscreen_2023_bg.parquet'
+
+# hawaii, northern mariana island, guam, puerto rico, US virgin islands, and american samoa aren't used
+ejscreen_drop_states = ['Hawaii', 'Northern Mariana Is', 'Guam', 'Puerto Rico', 'Virgin Islands', 'American Samoa']
+
+# columns of interest
+ejscreen_columns = ['ID', 'ACSTOTPOP',
+                    'PEOPCOLOR', 'PEOPCOLORPCT',
+                    'LINGISO', 'LINGISOPCT',
+                    'UNDER5', 'UNDER5PCT','OVER64', 'OVER64PCT', 
+                    'PM25', 'DSLPM', 'OZONE', 'CANCER', 'RESP',
+                    'RSEI_AIR', 'NPL_CNT', 'PNPL', 'TSDF_CNT', 'PTSDF',
+                    'PWDIS', 'UST', 'PRE1960', 'PRE1960PCT', 'PRMP',
+                    'AREALAND', 'AREAWATER', 'Shape_Length', 'Shape_Area']
+
+# explicit dtypes: the counts are integers (nullable Int64 in pandas, so they export without ".0"),
+# everything else stays float64 since these columns are exported as they are
+ejscreen_counts = ['ACSTOTPOP', 'PEOPCOLOR', 'LINGISO', 'UNDER5', 'OVER64', 'NPL_CNT', 'TSDF_CNT', 'PRE1960']
+ejscreen_types = {col: pa.int64() if col == 'ID' or col in ejscreen_counts else pa.float64()
+                  for col in ejscreen_columns}
+
+def ejscreen_to_pandas(table):
+    df = table.to_pandas()
+    return df.astype({col: 'Int64' for col in ejscreen_counts})
+
+# read only the columns of interest (and STATE_NAME to filter on), dropping the unused states batch by batch
+# the file isn't clean utf-8 (so pandas needed encoding_errors='ignore'), but only the parsed columns are
+# checked and those are numbers and plain ascii state names
+def read_ejscreen(path):
+    reader = pacsv.open_csv(path, convert_options=pacsv.ConvertOptions(
+        include_columns=['STATE_NAME'] + ejscreen_columns,
+        column_types={'STATE_NAME': pa.string(), **ejscreen_types}))
+    drop = pa.array(ejscreen_drop_states)
+    batches = [batch.filter(pc.invert(pc.is_in(batch.column('STATE_NAME'), value_set=drop))).select(ejscreen_columns)
+               for batch in reader]
+    return pa.Table.from_batches(batches)
+
+# the cache is reused while the source file, columns, dtypes and dropped states are the same
+def read_ejscreen_cached(path):
+    stat = os.stat(path)
+    cache_key = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, ejscreen_columns,
+                            {col: str(dtype) for col, dtype in ejscreen_types.items()},
+                            ejscreen_drop_states]).encode()
+    if os.path.exists(ejscreen_cache) and pq.read_schema(ejscreen_cache).metadata.get(b'cache_key') == cache_key:
+        return ejscreen_to_pandas(pq.read_table(ejscreen_cache))
+    table = read_ejscreen(path)
+    os.makedirs(os.path.dirname(ejscreen_cache), exist_ok=True)
+    pq.write_table(table.replace_schema_metadata({'cache_key': cache_key}), ejscreen_cache)
+    return ejscreen_to_pandas(table)
+
+# compare the full pandas read + filters with the pruned, filtered reader
+if run_benchmarks:
+    start = time.perf_counter()
+    full = pd.read_csv(ejscreen_path, encoding='utf-8', encoding_errors='ignore')
+    full = full[~full.STATE_NAME.isin(ejscreen_drop_states)][ejscreen_columns]
+    full_time = time.perf_counter() - start
+    start = time.perf_counter()
+    pruned = ejscreen_to_pandas(read_ejscreen(ejscreen_path))
+    pruned_time = time.perf_counter() - start
+    print('ejscreen: %.1f s -> %.1f s, %.0f MB -> %.0f MB'
+          % (full_time, pruned_time, full.memory_usage(deep=True).sum() / 1e6,
+             pruned.memory_usage(deep=True).sum() / 1e6))
+    del full, pruned
+
+ejscreen = read_ejscreen_cached(ejscreen_path)
 
 
 #%%
@@ -164,36 +335,21 @@ ejscreen = pd.read_csv('EJSCREEN_2023_BG_with_AS_CNMI_GU_VI.csv', encoding='utf-
 
 ### 5. clean ejscreen data
 
-# delete hawaii, northern mariana island, guam, puerto rico, US virgin islands, and american samoa
-ejscreen = ejscreen[ejscreen.STATE_NAME != 'Hawaii']
-ejscreen = ejscreen[ejscreen.STATE_NAME != 'Northern Mariana Is']
-ejscreen = ejscreen[ejscreen.STATE_NAME != 'Guam']
-ejscreen = ejscreen[ejscreen.STATE_NAME != 'Puerto Rico']
-ejscreen = ejscreen[ejscreen.STATE_NAME != 'Virgin Islands']
-ejscreen = ejscreen[ejscreen.STATE_NAME != 'American Samoa']
-
-# select columns of interest
-ejscreen = ejscreen[['ID', 'ACSTOTPOP',
-                     'PEOPCOLOR', 'PEOPCOLORPCT',
-                     'LINGISO', 'LINGISOPCT',
-                     'UNDER5', 'UNDER5PCT','OVER64', 'OVER64PCT', 
-                     'PM25', 'DSLPM', 'OZONE', 'CANCER', 'RESP',
-                     'RSEI_AIR', 'NPL_CNT', 'PNPL', 'TSDF_CNT', 'PTSDF',
-                     'PWDIS', 'UST', 'PRE1960', 'PRE1960PCT', 'PRMP',
-                     'AREALAND', 'AREAWATER', 'Shape_Length', 'Shape_Area']]
+# (the unused states were filtered out and the columns of interest selected by read_ejscreen)
 
 
 #%%
 
 ### 6. merge census and ejscreen data
 
-# merge acs data to ejscreen data, keeping all ejscreen data
-acs_ej = ejscreen.merge(acs, on = "ID", how = "left", indicator=True)
+# merge acs data to ejscreen data on the acs ID index, keeping all ejscreen data
+acs_ej = ejscreen.join(acs, on = "ID")
 
 # there are 2 block groups that are in the census TIGERLINE file & ejscreen file but not in the ACS files...
-# thus, there are stored as NaNs and throw errors as pandas reads the 2 NaNs as duplicates later on
-# let's delete these for now
-acs_ej.drop_duplicates(subset=['GEO_ID'], inplace = True)
+# they have no acs data at all, so report them and let's delete these for now
+no_acs = acs_ej['GEO_ID'].isna()
+print(str(no_acs.sum()) + " ejscreen block groups aren't in the ACS data: " + str(acs_ej.loc[no_acs, 'ID'].tolist()))
+acs_ej = acs_ej[~no_acs]
 
 
 #%%
@@ -220,350 +376,283 @@ acs_ej.insert(4, 'Block_Group', bg)
 
 # delete unneeded columns
 acs_ej.drop(labels=['NAME'], axis=1,inplace = True)
-acs_ej.drop(labels=['_merge'], axis=1,inplace = True)
 
-# clean acs data with jam values
-# source: https://www.census.gov/programs-surveys/acs/technical-documentation/code-lists.html "jam values"
+# acs data with jam values was already cleaned by read_acs_table (clean_jam_values)
+# QA: how many of each jam value every column had
+print(acs_jam_counts[acs_jam_counts.sum(axis=1) > 0])
 
-# - : margin of error for median > median
-acs_ej = acs_ej.replace({"-": np.nan}) 
 
-# N : data can't be displayed because there were an insufficient number of samples
-acs_ej = acs_ej.replace({"N": np.nan})
-
-# (X) : data isn't applicable or isn't available
-acs_ej = acs_ej.replace({"(X)": np.nan})
+#%%
 
-# ** : the margin of error could not be computed because there weren't enough samples
-acs_ej = acs_ej.replace({"**": np.nan})
 
-# ***** : margin of error isn't appropriate because the measure corresponds to a single measure
-# effectively, the margin of error should be treated as 0
-acs_ej = acs_ej.replace({"*****": 0})
+### margins of error for derived estimates
 
+# formulas on pg 61-65: https://www.census.gov/content/dam/Census/library/publications/2020/acs/acs_general_handbook_2020_ch08.pdf
+# everything works on whole numpy arrays: one row per block group, and estimates and
+# moes of the same columns kept as parallel matrices
 
-#%%
+# estimate and moe matrices for a list of estimate columns (moe columns are the same codes with M)
+def est_moe_matrices(df, est_cols):
+    moe_cols = [col[:-1] + 'M' for col in est_cols]
+    return df[est_cols].to_numpy(dtype=float), df[moe_cols].to_numpy(dtype=float)
 
+# num / den, NaN where den is 0 (or missing) instead of inf
+def safe_divide(num, den):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den != 0, num / den, np.nan)
 
-### 8. create EJ metrics of my own - percentages with no aggregation required
-
-# list of acs data I want to work with
-acs_list = ['B25009', # for %rented
-            'B25024', # for %mobile home
-            'B28002', # for %no internet access
-            'B28001', # for %no computer at home
-            'B25047', # for %no plumbing
-            'B19058', # for %receiving SNAP/public assistance
-            'C17002_und0.5', # for %families whose income is ½x the poverty threshold for their family size
-            'B25070_50pls'] # for %extremely cost-burdened ppl (spend over 50% of income on rent)
-
-# initialize empty list to append my finished dfs to later
-list_pct_ej_metrics = []
-
-for file in acs_list:
-    print("Working on " + file + "...")
-    
-    # select columns relevant for %rented calculation
-    if file == 'B25009':
-        df = acs_ej[['GEO_ID','B25009_001E','B25009_001M','B25009_010E','B25009_010M']]
-    
-    # select columns relevant for %mobile home calculation
-    if file == 'B25024':
-        df = acs_ej[['GEO_ID','B25024_001E','B25024_001M','B25024_010E','B25024_010M']]
-    
-    # select columns relevant for %no internet access calculation
-    if file == 'B28002':
-        df = acs_ej[['GEO_ID','B28002_001E','B28002_001M','B28002_013E','B28002_013M']]
-    
-    # select columns relevant for %no computer at home calculation
-    if file == 'B28001':
-        df = acs_ej[['GEO_ID','B28001_001E','B28001_001M','B28001_011E','B28001_011M']]
-    
-    # select columns relevant for %no plumbing calculation
-    if file == 'B25047':
-        df = acs_ej[['GEO_ID','B25047_001E','B25047_001M','B25047_003E','B25047_003M']]
-    
-    # select columns relevant for %receiving SNAP/public assistance calculation
-    if file == 'B19058':
-        df = acs_ej[['GEO_ID','B19058_001E','B19058_001M','B19058_002E','B19058_002M']]
-    
-    # select columns relevant for %extreme poverty calculation
-    if file == 'C17002_und0.5':
-        df = acs_ej[['GEO_ID','C17002_001E','C17002_001M','C17002_002E','C17002_002M']]
-    
-    # select columns relevant for %extremely cost-burdened ppl (spend over 50% of income on rent) calculation
-    if file == 'B25070_50pls':
-        df = acs_ej[['GEO_ID','B25070_001E','B25070_001M','B25070_010E','B25070_010M']]  
-    
-    # rename columns to streamline process
-    df.rename(columns={df.columns[1]: 'TOT_EST',
-                       df.columns[2]: 'MOE_TOT_EST',
-                       df.columns[3]: 'NUM',
-                       df.columns[4]: 'MOE_NUM'}, inplace= True)
-    
-    # convert to floats to do calculations
-    df[['TOT_EST', 'MOE_TOT_EST', 'NUM', 'MOE_NUM']] = df[['TOT_EST', 'MOE_TOT_EST', 'NUM', 'MOE_NUM']].astype(float)
-    # delete first row (it contains column descriptions, no data)
-    df = df[1:]
-    
-    # calculate proportion and percent of interest
-    df['PROP'] = df['NUM'] / df['TOT_EST']
-    df['PCT'] = df['PROP']
-    
-    # calculate margin of error corresponding to the pct of interest
-    # formulas on pg 63-64: https://www.census.gov/content/dam/Census/library/publications/2020/acs/acs_general_handbook_2020_ch08.pdf
-    df['MOE_PCT'] = (1/df['TOT_EST']) * np.sqrt(pow(df['MOE_NUM'],2) - (pow(df['PROP'],2) * pow(df['MOE_TOT_EST'],2)))
-    
-    # keep only columns of interest
-    df = df[['GEO_ID','PCT', 'MOE_PCT']]
-    # rename columns
-    df.rename(columns={df.columns[1]: str(file) + '_PCT',
-                       df.columns[2]: str(file) + '_PCT_MOE'}, inplace= True)
-    # set index to geoid to keep geoid unique
-    df.set_index('GEO_ID', inplace = True)
-    
-    # append this df to list
-    list_pct_ej_metrics.append(df)
-    
-    print("Complete!")
+# sums of estimates, one per column of weights (a columns x sums matrix); missing estimates count as 0
+def sum_estimates(ests, weights):
+    return np.nan_to_num(ests) @ weights
 
+# moes of the same sums: square root of the summed squared moes (pg 61)
+# a weighted estimate a*X has moe a*MOE(X); missing moes count as 0
+def moe_sum(moes, weights):
+    return np.sqrt(np.nan_to_num(moes) ** 2 @ weights ** 2)
 
-#%%
+# moe of a ratio num / den (pg 65)
+def moe_ratio(num, den, moe_num, moe_den):
+    ratio = safe_divide(num, den)
+    return safe_divide(np.sqrt(moe_num ** 2 + ratio ** 2 * moe_den ** 2), den)
 
-
-### 10. create EJ metrics of my own - percentages with aggregation required
-
-# list of acs data I want to work with
-metrics_to_agg = ['B11012', # for %single parent household
-                  'B15003_nohsgrad', # for %no diploma or GED
-                  'B27010_18und', # for %ppl aged 18 and under w/gov-provided or no healthcare
-                  'B27010_65pls', # for %ppl aged 65 and up w/gov-provided or no healthcare
-                  'B27010_uninsured', # for %uninsured ppl 
-                  'C17002_und1', # for %families whose income is equal to the poverty threshold for their family size
-                  'C17002_und1.5', # for %families whose income is 3/2x the poverty threshold for their family size
-                  'C17002_und2', # for %families whose income is 2x the poverty threshold for their family size
-                  'B25070_30pls'] # for %cost-burdened ppl (spend over 30% of income on rent)
-
-# initialize empty list to append my finished dfs to later                  
-agg_ej_metric_list = []
-
-for file in metrics_to_agg:
-    print("Working on " + file + "...")
-    
-    # select columns relevant for %single parent household calculation
-    if file == 'B11012':
-        df = acs_ej[['GEO_ID', 'B11012_001E', 'B11012_001M', 'B11012_008E',
-                     'B11012_008M', 'B11012_013E', 'B11012_013M']]
-        
-    # select columns relevant for %no diploma or GED calculation
-    if file == 'B15003_nohsgrad':
-        df = acs_ej[['GEO_ID', 'B15003_001E', 'B15003_001M', 'B15003_002E',
-                     'B15003_002M', 'B15003_003E', 'B15003_003M', 'B15003_004E',
-                     'B15003_004M', 'B15003_005E', 'B15003_005M', 'B15003_006E',
-                     'B15003_006M', 'B15003_007E', 'B15003_007M', 'B15003_008E',
-                     'B15003_008M', 'B15003_009E', 'B15003_009M', 'B15003_010E',
-                     'B15003_010M', 'B15003_011E', 'B15003_011M', 'B15003_012E',
-                     'B15003_012M', 'B15003_013E', 'B15003_013M', 'B15003_014E',
-                     'B15003_014M', 'B15003_015E', 'B15003_015M', 'B15003_016E',
-                     'B15003_016M']]
-        
-    # select columns relevant for %ppl aged 18 and under w/medicaid or no healthcare calculation    
-    if file == 'B27010_18und':
-        df = acs_ej[['GEO_ID', 'B27010_002E', 'B27010_002M',
-                     'B27010_007E', 'B27010_007M',
-                     'B27010_013E', 'B27010_013M',
-                     'B27010_017E', 'B27010_017M']]
-    
-    # select columns relevant for %ppl aged 65+ w/medicaid or no healthcare calculation
-    if file == 'B27010_65pls':
-        df = acs_ej[['GEO_ID', 'B27010_051E', 'B27010_051M',
-                     'B27010_062E','B27010_062M',
-                     'B27010_066E','B27010_066M']] 
-        
-    # select columns relevant for %uninsured ppl
-    if file == 'B27010_uninsured':
-        df = acs_ej[['GEO_ID', 'B27010_001E', 'B27010_001M',
-                     'B27010_017E','B27010_017M',
-                     'B27010_033E', 'B27010_033M',
-                     'B27010_050E','B27010_050M',
-                     'B27010_066E', 'B27010_066M']]
-    
-    # for %families whose income is equal to the poverty threshold for their family size
-    if file == 'C17002_und1':
-        df = acs_ej[['GEO_ID', 'C17002_001E', 'C17002_001M', 'C17002_002E', 'C17002_002M', 'C17002_003E', 'C17002_003M']]
-
-    # for %families whose income is 3/2x the poverty threshold for their family size
-    if file == 'C17002_und1.5': 
-        df = acs_ej[['GEO_ID', 'C17002_001E', 'C17002_001M', 'C17002_002E', 'C17002_002M', 'C17002_003E', 'C17002_003M',
-                     'C17002_004E', 'C17002_004M', 'C17002_005E', 'C17002_005M']]
-        
-    # for %families whose income is 2x the poverty threshold for their family size
-    if file == 'C17002_und2': 
-        df = acs_ej[['GEO_ID', 'C17002_001E', 'C17002_001M', 'C17002_002E', 'C17002_002M', 'C17002_003E', 'C17002_003M',
-                     'C17002_004E', 'C17002_004M', 'C17002_005E', 'C17002_005M',
-                     'C17002_006E', 'C17002_006M', 'C17002_007E', 'C17002_007M', 'C17002_008E', 'C17002_008M']]
-    
-    # select columns relevant for %cost-burdened ppl (spend over 30% of income on rent)
-    if file == 'B25070_30pls':
-        df = acs_ej[['GEO_ID', 'B25070_001E', 'B25070_001M', 'B25070_007E',
-                     'B25070_007M', 'B25070_008E', 'B25070_008M', 'B25070_009E', 'B25070_009M', 'B25070_010E', 'B25070_010M']]      
-    
-    # change data to float type for calculations later on
-    df.iloc[:, 1:] = df.iloc[:, 1:].astype(float)
-    # replace 0s with NaNs
-    df.replace(0, np.nan, inplace=True)
-    # drop first row (it contains column descriptions, no data)
-    df = df[1:]
-    # rename columns to streamline things
-    df.rename(columns={df.columns[1]: 'TOT_EST',
-                       df.columns[2]: 'MOE_TOT_EST'}, inplace= True)
-    
-    # filter for estimate columns (this doesn't include the total estimate column since we renamed it)
-    ests = [col for col in df.columns if col.endswith('E')]
-    # sum estimates
-    df['AGG_EST'] = df[ests].sum(axis=1)
-    
-    # calculate proportion and pct of interest
-    df['PROP'] = df['AGG_EST'] / df['TOT_EST']
-    df['PCT'] = df['PROP']
-    
-    # filter for moe columns (this doesn't include the total estimate moe column since we renamed it)
-    moes = df[[col for col in df.columns if col.endswith('M')]]
-    # create function to calculate margins of error corresponding to the aggregated estimates
-    # formulas on pg 61-63: https://www.census.gov/content/dam/Census/library/publications/2020/acs/acs_general_handbook_2020_ch08.pdf
-    def agg_moe_calc(x):
-        moe_sq = x * x
-        add = np.sum(moe_sq)
-        sqrtd = np.sqrt(add)
-        return(sqrtd)
-    # run function on aggregated estimates, row by row
-    moes_final = moes.apply(agg_moe_calc, axis=1)
-    df = pd.concat([df, moes_final], axis=1)
-    # rename column
-    df.rename(columns={df.columns[-1]: 'MOE'}, inplace = True)
-
-    # calculate pct moe
-    # formulas on pg 63-64: https://www.census.gov/content/dam/Census/library/publications/2020/acs/acs_general_handbook_2020_ch08.pdf
-    df['MOE_PCT'] = (1/df['TOT_EST']) * np.sqrt(pow(df['MOE'], 2) - (pow(df['PROP'], 2) * pow(df['MOE_TOT_EST'], 2)))
-
-    # keep only relevant columns
-    df = df[['GEO_ID','PCT', 'MOE_PCT']]
-    # rename columns
-    df.rename(columns={df.columns[1]: str(file) + '_PCT',
-                       df.columns[2]: str(file) + '_PCT_MOE'}, inplace= True)
-    # set index to geoid to keep geoid unique
-    df.set_index('GEO_ID', inplace = True)
-    
-    # append this df to list
-    agg_ej_metric_list.append(df)
-    
-    print("Complete!")
+# moe of a proportion, where num is a subset of den (pg 63-64)
+# if the value under the square root is negative, the handbook says to use the ratio formula instead
+def moe_proportion(num, den, moe_num, moe_den):
+    prop = safe_divide(num, den)
+    radicand = moe_num ** 2 - prop ** 2 * moe_den ** 2
+    radicand = np.where(radicand < 0, moe_num ** 2 + prop ** 2 * moe_den ** 2, radicand)
+    return safe_divide(np.sqrt(radicand), den)
 
 
 #%%
 
 
-### 12. create EJ metrics of my own - educational attainment score
-
-# creating a complex variable here, and my previous cells aren't equipped to include this
-
-# select columns relevant for educational attainment score
-# not including "no school completed", "nursery school", or "kindergarden" towards educational attainment score
-df = acs_ej[['GEO_ID', 'B15003_001E', 'B15003_001M',
-             'B15003_005E', 'B15003_005M', 'B15003_006E',
-             'B15003_006M', 'B15003_007E', 'B15003_007M', 'B15003_008E',
-             'B15003_008M', 'B15003_009E', 'B15003_009M', 'B15003_010E',
-             'B15003_010M', 'B15003_011E', 'B15003_011M', 'B15003_012E',
-             'B15003_012M', 'B15003_013E', 'B15003_013M', 'B15003_014E',
-             'B15003_014M', 'B15003_015E', 'B15003_015M', 'B15003_016E',
-             'B15003_016M', 'B15003_017E', 'B15003_017M', 'B15003_018E',
-             'B15003_018M', 'B15003_019E', 'B15003_019M', 'B15003_020E',
-             'B15003_020M', 'B15003_021E', 'B15003_021M', 'B15003_022E',
-             'B15003_022M', 'B15003_023E', 'B15003_023M', 'B15003_024E',
-             'B15003_024M', 'B15003_025E', 'B15003_025M']]
-
-# recategorize data as floats for calculations later
-df.iloc[:, 1:] = df.iloc[:, 1:].astype(float)
-# rename columns for ease (not necessary, but allows for copy-paste of formula above with minimal changes)
-df.rename(columns={df.columns[1]: 'TOT_EST',
-                   df.columns[2]: 'MOE_TOT_EST'}, inplace= True)
-
-# assign each grade-level an ascending point value (ex: 1st grade = 1 pt, 12th grade = 12 pts)
-# this effectively weights the population by their educational attainment
-# sum these weighted values to get the total educational attainment score for each block group
-df['sum_educ'] = ((df['B15003_005E'] * 1) + # 1st grade
-                  (df['B15003_006E'] * 2) + # 2nd grade
-                  (df['B15003_007E'] * 3) + # 3rd grade
-                  (df['B15003_008E'] * 4) + # 4th grade
-                  (df['B15003_009E'] * 5) + # 5th grade
-                  (df['B15003_010E'] * 6) + # 6th grade
-                  (df['B15003_011E'] * 7) + # 7th grade
-                  (df['B15003_012E'] * 8) + # 8th grade
-                  (df['B15003_013E'] * 9) + # 9th grade
-                  (df['B15003_014E'] * 10) + # 10th grade
-                  (df['B15003_015E'] * 11) + # 11th grade 
-                  (df['B15003_016E'] * 12) + # 12th grade, no diploma
-                  (df['B15003_017E'] * 13) + # 12th grade, HS diploma
-                  (df['B15003_018E'] * 13) + # 12th grade, GED or alternative credential
-                  (df['B15003_019E'] * 14) + # some college, less than 1 yr
-                  (df['B15003_020E'] * 14) + # some college, 1+ yrs, no degree
-                  (df['B15003_021E'] * 15) + # associates degree
-                  (df['B15003_022E'] * 16) + # bachelors degree
-                  (df['B15003_023E'] * 17) + # masters degree
-                  (df['B15003_024E'] * 18) + # professional school degree
-                  (df['B15003_025E'] * 19))  # doctorate degree
-
-# replace any block groups with 0 people with educational attainment data so we don't divide by 0 and throw an error
-df['TOT_EST'] = df['TOT_EST'].replace(0, np.NaN)
-# calculate per-capita educational attainment score
-df['PROP'] = df['sum_educ'] / df['TOT_EST']
-
-# filter for moe columns
-moes = df[[col for col in df.columns if col.endswith('M')]]
-# aggregated moe function
-# formulas on pg 61-63: https://www.census.gov/content/dam/Census/library/publications/2020/acs/acs_general_handbook_2020_ch08.pdf
-def agg_moe_calc(x):
-    moe_sq = x * x
-    add = np.sum(moe_sq)
-    sqrtd = np.sqrt(add)
-    return(sqrtd)
-moes_final = moes.apply(agg_moe_calc, axis = 1)
-df = pd.concat([df, moes_final], axis=1)
-df.rename(columns={df.columns[-1]: 'MOE'}, inplace = True)
-
-# calculate ratio moe column
-# formulas on pg 65: https://www.census.gov/content/dam/Census/library/publications/2020/acs/acs_general_handbook_2020_ch08.pdf
-# I had to split this up because I was struggling with the NaNs, but it's the same calculation shown in the documentation
-df['step1'] = pow(df['MOE'], 2) + (pow(df['PROP'], 2) * pow(df['MOE_TOT_EST'], 2))
-# deal with nans
-df['step1'] = df['step1'].replace([np.inf, -np.inf], np.nan).fillna(0)
-df['step2'] = np.sqrt(df['step1'])
-df['step3'] = (1/df['TOT_EST']) * df['step2']
-
-df = df[['GEO_ID','PROP', 'step3']]  
-df.rename(columns={df.columns[1]: 'B15003_educscore',
-                   df.columns[2]: 'B15003_educscore_MOE'}, inplace= True)
-df.set_index('GEO_ID', inplace = True)
-
-agg_ej_metric_list.append(df)
- 
+### 8. create EJ metrics of my own
+
+# every metric is a (weighted) sum of numerator estimates over a denominator (total) estimate
+# 'num': numerator estimate columns, 'den': denominator estimate column
+# 'weights': optional point value of each numerator column (default 1), applied to the estimates only
+# 'moe': 'proportion' when the numerator is a subset of the denominator (default), 'ratio' otherwise
+# the metric's moe column is its name + '_MOE'
+
+# estimate columns of a table for a range of line numbers, ex: ('B15003', range(2, 5)) -> B15003_002E ... B15003_004E
+def estimate_columns(table, lines):
+    return [table + '_' + str(line).zfill(3) + 'E' for line in lines]
+
+ej_metric_specs = {
+    # percentages with no aggregation required
+    # %rented
+    'B25009_PCT': {'den': 'B25009_001E', 'num': ['B25009_010E']},
+    # %mobile home
+    'B25024_PCT': {'den': 'B25024_001E', 'num': ['B25024_010E']},
+    # %no internet access
+    'B28002_PCT': {'den': 'B28002_001E', 'num': ['B28002_013E']},
+    # %no computer at home
+    'B28001_PCT': {'den': 'B28001_001E', 'num': ['B28001_011E']},
+    # %no plumbing
+    'B25047_PCT': {'den': 'B25047_001E', 'num': ['B25047_003E']},
+    # %receiving SNAP/public assistance
+    'B19058_PCT': {'den': 'B19058_001E', 'num': ['B19058_002E']},
+    # %families whose income is ½x the poverty threshold for their family size
+    'C17002_und0.5_PCT': {'den': 'C17002_001E', 'num': ['C17002_002E']},
+    # %extremely cost-burdened ppl (spend over 50% of income on rent)
+    'B25070_50pls_PCT': {'den': 'B25070_001E', 'num': ['B25070_010E']},
+
+    # percentages with aggregation required
+    # %single parent household
+    'B11012_PCT': {'den': 'B11012_001E', 'num': ['B11012_008E', 'B11012_013E']},
+    # %no diploma or GED
+    'B15003_nohsgrad_PCT': {'den': 'B15003_001E', 'num': estimate_columns('B15003', range(2, 17))},
+    # %ppl aged 18 and under w/medicaid or no healthcare
+    'B27010_18und_PCT': {'den': 'B27010_002E', 'num': ['B27010_007E', 'B27010_013E', 'B27010_017E']},
+    # %ppl aged 65+ w/medicaid or no healthcare
+    'B27010_65pls_PCT': {'den': 'B27010_051E', 'num': ['B27010_062E', 'B27010_066E']},
+    # %uninsured ppl
+    'B27010_uninsured_PCT': {'den': 'B27010_001E', 'num': ['B27010_017E', 'B27010_033E', 'B27010_050E', 'B27010_066E']},
+    # %families whose income is equal to the poverty threshold for their family size
+    'C17002_und1_PCT': {'den': 'C17002_001E', 'num': estimate_columns('C17002', range(2, 4))},
+    # %families whose income is 3/2x the poverty threshold for their family size
+    'C17002_und1.5_PCT': {'den': 'C17002_001E', 'num': estimate_columns('C17002', range(2, 6))},
+    # %families whose income is 2x the poverty threshold for their family size
+    'C17002_und2_PCT': {'den': 'C17002_001E', 'num': estimate_columns('C17002', range(2, 9))},
+    # %cost-burdened ppl (spend over 30% of income on rent)
+    'B25070_30pls_PCT': {'den': 'B25070_001E', 'num': estimate_columns('B25070', range(7, 11))},
+
+    # educational attainment score
+    # each grade-level gets an ascending point value (ex: 1st grade = 1 pt, 12th grade = 12 pts)
+    # this effectively weights the population by their educational attainment, and the
+    # per-capita score is the weighted sum over the total population with educational attainment data
+    # not including "no school completed", "nursery school", or "kindergarden" towards the score
+    'B15003_educscore': {'den': 'B15003_001E',
+                         'num': estimate_columns('B15003', range(5, 26)),
+                         'weights': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, # 1st - 11th grade
+                                     12, # 12th grade, no diploma
+                                     13, 13, # 12th grade, HS diploma / GED or alternative credential
+                                     14, 14, # some college, less than 1 yr / 1+ yrs, no degree
+                                     15, # associates degree
+                                     16, # bachelors degree
+                                     17, # masters degree
+                                     18, # professional school degree
+                                     19], # doctorate degree
+                         'moe': 'ratio'}}
+
+# evaluate all metric specs at once
+# the estimate columns any metric uses are pulled into one aligned matrix (and its moe matrix),
+# the numerators of every metric are one matrix product with a (columns x metrics) weight matrix,
+# and the proportions/ratios and their moes are computed for all metrics and block groups together
+def compute_ej_metrics(df, specs):
+    est_cols = list(dict.fromkeys(col for spec in specs.values() for col in [spec['den']] + spec['num']))
+    position = {col: i for i, col in enumerate(est_cols)}
+    ests, moes = est_moe_matrices(df, est_cols)
+
+    weights = np.zeros((len(est_cols), len(specs)))
+    for j, spec in enumerate(specs.values()):
+        weights[[position[col] for col in spec['num']], j] = spec.get('weights', 1)
+    den_cols = [position[spec['den']] for spec in specs.values()]
+    is_ratio = np.array([spec.get('moe', 'proportion') == 'ratio' for spec in specs.values()])
+
+    # the weights only apply to the estimates: the numerator moe is the unweighted root sum of squares
+    # of the numerator columns' moes (as the education score moe has always been computed)
+    num, moe_num = sum_estimates(ests, weights), moe_sum(moes, (weights != 0).astype(float))
+    den, moe_den = ests[:, den_cols], moes[:, den_cols]
+    value = safe_divide(num, den)
+    moe = np.where(is_ratio, moe_ratio(num, den, moe_num, moe_den), moe_proportion(num, den, moe_num, moe_den))
+
+    metrics = {}
+    for j, name in enumerate(specs):
+        metrics[name] = value[:, j]
+        metrics[name + '_MOE'] = moe[:, j]
+    return pd.DataFrame(metrics, index=df.index)
+
+ej_metrics = compute_ej_metrics(acs_ej, ej_metric_specs)
+
 
 #%%
 
 
-### 9. merge all new fields into one df and attach it to the acs_ej df
-pct_ej_metrics = pd.concat(list_pct_ej_metrics[:8], axis=1, sort=False).reset_index() 
+### 9. exact moes from the variance replicate estimate (VRE) tables
+
+# the moe formulas above are approximations for aggregated metrics; the VRE tables have 80 replicate
+# estimates of every table line, so the moe of any metric can be computed exactly:
+# variance = 4/80 * sum over replicates of (replicate metric - metric)^2, moe = 1.645 * sqrt(variance)
+# source: https://www.census.gov/programs-surveys/acs/data/variance-tables.html
+
+# set to True to replace the approximated moes of these metrics (their spec in ej_metric_specs is
+# evaluated on the replicates); state zips missing from vre_dir are downloaded once
+use_vre_moes = False
+vre_metrics = ['B27010_18und_PCT', # %ppl aged 18 and under w/medicaid or no healthcare
+               'B27010_65pls_PCT', # %ppl aged 65+ w/medicaid or no healthcare
+               'B27010_uninsured_PCT'] # %uninsured ppl
+vre_dir = 'VRE'
+vre_url = 'https://www2.census.gov/programs-surveys/acs/replicate_estimates/2021/data/5-year/150/'
+vre_timeout = 60
+vre_workers = 8
+vre_replicates = ['Var_Rep' + str(i) for i in range(1, 81)]
+
+# table line number of an estimate column, ex: B27010_017E -> 17
+def table_line(col):
+    return int(col.split('_')[1][:3])
+
+# local zip of a table's VRE file for one state (2-digit fips), downloaded once if it isn't there yet
+# the download is streamed to a temporary file and only moved into place once it is a complete zip,
+# so an interrupted or error-page download is retried on the next run instead of kept
+def vre_zip_path(table, state_fips):
+    path = os.path.join(vre_dir, table + '_' + state_fips + '.csv.zip')
+    if not os.path.exists(path):
+        os.makedirs(vre_dir, exist_ok=True)
+        tmp_path = path + '.part'
+        try:
+            with requests.get(vre_url + os.path.basename(path), stream=True, timeout=vre_timeout) as r:
+                r.raise_for_status()
+                with open(tmp_path, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=1 << 20):
+                        f.write(chunk)
+            if not zipfile.is_zipfile(tmp_path):
+                raise zipfile.BadZipFile("Download of " + os.path.basename(path) + " isn't a zip file")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return path
+
+# stream the rows of the given table lines straight out of the zip member (nothing is extracted to disk)
+# only GEOID, ORDER, ESTIMATE and the replicates are parsed, and rows are filtered on ORDER batch by batch
+# (TITLE isn't unique within a table, ex: 'No health insurance coverage' is repeated for every age group)
+# returns the 12-digit block group geoids and the estimates (bgs x lines) and replicates (bgs x lines x 80)
+def read_vre_lines(table, state_fips, lines):
+    number_types = {col: pa.float64() for col in ['ORDER', 'ESTIMATE'] + vre_replicates}
+    keep = pa.array(lines, pa.float64())
+    with zipfile.ZipFile(vre_zip_path(table, state_fips)) as z, z.open(z.namelist()[0]) as f:
+        # some states' files aren't utf-8 (ex: new mexico), the columns we read are plain ascii either way
+        reader = pacsv.open_csv(f, read_options=pacsv.ReadOptions(encoding='latin-1'),
+                                convert_options=pacsv.ConvertOptions(
+                                    include_columns=['GEOID'] + list(number_types),
+                                    column_types={'GEOID': pa.string(), **number_types}))
+        vre = pa.Table.from_batches([batch.filter(pc.is_in(batch.column('ORDER'), value_set=keep))
+                                     for batch in reader], schema=reader.schema)
+
+    geoids, bg = np.unique(pc.utf8_slice_codeunits(vre.column('GEOID'), -12).to_numpy(zero_copy_only=False),
+                           return_inverse=True)
+    line = pd.Index(lines).get_indexer(vre.column('ORDER').to_numpy().astype(int))
+    ests = np.full((len(geoids), len(lines)), np.nan)
+    reps = np.full((len(geoids), len(lines), len(vre_replicates)), np.nan)
+    ests[bg, line] = vre.column('ESTIMATE').to_numpy()
+    reps[bg, line] = np.column_stack([vre.column(col).to_numpy() for col in vre_replicates])
+    return geoids, ests, reps
+
+# exact moes of metric specs from the estimates and replicates of their table lines
+# every metric is computed for the estimate and all 80 replicates at once, then the
+# successive difference variance is one reduction over the replicate axis
+def vre_moes(ests, reps, lines, specs):
+    line_pos = {line: i for i, line in enumerate(lines)}
+    weights = np.zeros((len(lines), len(specs)))
+    for j, spec in enumerate(specs.values()):
+        weights[[line_pos[table_line(col)] for col in spec['num']], j] = spec.get('weights', 1)
+    den = [line_pos[table_line(spec['den'])] for spec in specs.values()]
+
+    values = safe_divide(np.nan_to_num(ests) @ weights, ests[:, den])
+    rep_values = safe_divide(np.einsum('blr,lm->bmr', np.nan_to_num(reps), weights), reps[:, den, :])
+    variance = 4 / len(vre_replicates) * np.sum((rep_values - values[:, :, None]) ** 2, axis=2)
+    return 1.645 * np.sqrt(variance)
+
+# exact moes for one state's block groups, indexed by 12-digit geoid
+# (None if the state's zip is bad or can't be downloaded, so the other states still go through)
+def vre_state_moes(table, state_fips, specs):
+    lines = sorted({table_line(col) for spec in specs.values() for col in [spec['den']] + spec['num']})
+    try:
+        geoids, ests, reps = read_vre_lines(table, state_fips, lines)
+    except (zipfile.BadZipFile, requests.RequestException) as err:
+        print("Skipping VRE " + table + " for state FIPS code " + state_fips + ": " + str(err))
+        return None
+    return pd.DataFrame(vre_moes(ests, reps, lines, specs), index=geoids,
+                        columns=[name + '_MOE' for name in specs])
+
+if use_vre_moes:
+    # states with acs block groups
+    vre_states = sorted(acs_ej.GEO_ID.dropna().str[9:11].unique())
+    vre_specs = {name: ej_metric_specs[name] for name in vre_metrics}
+    for table in sorted({spec['den'].split('_')[0] for spec in vre_specs.values()}):
+        print("Working on " + table + "...")
+        specs = {name: spec for name, spec in vre_specs.items() if spec['den'].startswith(table + '_')}
+        # states are read and reduced in parallel (the pyarrow reads and numpy math release the GIL)
+        with ThreadPoolExecutor(max_workers=vre_workers) as pool:
+            state_moes = list(pool.map(lambda state_fips: vre_state_moes(table, state_fips, specs), vre_states))
+        exact = pd.concat([moes for moes in state_moes if moes is not None])
+        # replace the approximated moes, keeping them for block groups without replicates
+        exact = exact.reindex(acs_ej.GEO_ID.str[9:]).set_axis(ej_metrics.index)
+        print("Exact moes for " + str(exact.notna().all(axis=1).sum()) + " of " + str(len(exact)) + " block groups")
+        ej_metrics.update(exact)
+        print("Complete!")
 
-agg_ej_metrics = pd.concat(agg_ej_metric_list[:10],axis=1, sort=False).reset_index()
 
-my_metrics = pd.merge(pct_ej_metrics,agg_ej_metrics, on = "GEO_ID", how = "inner")
+#%%
 
-# delete acs data used to make my own metrics
 
-acs_ej = acs_ej.iloc[:, :34]
+### 10. attach the new fields to the acs_ej df
 
-# merge
-acs_ej_final = pd.merge(acs_ej, my_metrics, on = "GEO_ID", how = "inner")
+# identifiers and ejscreen data, then my own metrics (acs data used to make my metrics is left out)
+acs_ej_final = pd.concat([acs_ej[['ID', 'State', 'County', 'Census_Tract', 'Block_Group'] + ejscreen_columns[1:] + ['GEO_ID']],
+                          ej_metrics], axis=1)
 
 # make geoid_12 and state abbreviation columns
 acs_ej_final['GEOID_12'] = acs_ej_final.GEO_ID.str[9:]
@@ -671,85 +760,3 @@ acs_ej_final = acs_ej_final[['FIPS', 'GEOID_21', 'GEOID_12',
 ### Export dataset 
 os.chdir('/Users/gracehauser/Desktop/Publication/Results')
 acs_ej_final.to_csv('acs_ej_final.csv', sep=',', index=False, encoding='utf-8')
-
-
-#%%
-# # Extra code
-
-# ### 10. create EJ metrics of my own - download VRE tables for percentages with aggregation required
-
-# # make list of tables to download
-# vre_list = [#'B25014', # tenure x occupants per room (for use in renter:total households ratio)
-#             #'B25024', # units in structure (for mobile home categorization)
-#             'B27010', # types of health insurance x age
-#             #'B28002', # internet subscription
-#             #'B28001' # computer access
-#            ]
-# # initialize empty list for ______
-# vre_df_list = []
-# # for B27010 only: list of which rows we want to import (file is really big)
-# hc = ['Under 19 years:', 'With Medicare coverage only', 'With Medicaid/means-tested public coverage only', 'No health insurance coverage',
-#       '65 years and over:', 'With Medicare coverage only', 'With Medicaid/means-tested public coverage only', 'No health insurance coverage']
-
-# for file in vre_list:
-#     print("Working on " + file + "...")
-#     appended_data = []
-    
-#     for state_num in range(1,3):
-#         if state_num <= 9:
-#             filename = file + "_0" + str(state_num) + ".csv" 
-#         else: 
-#             filename = file + "_" + str(state_num) + ".csv"
-#         url = 'https://www2.census.gov/programs-surveys/acs/replicate_estimates/2021/data/5-year/150/' + filename + '.zip'
-#         r = requests.get(url)
-#         try:
-#             z = zipfile.ZipFile(io.BytesIO(r.content))
-#             z.extractall()
-
-#             df = pd.read_csv(filename, sep=',', encoding='latin-1' if state_num == 35 else None)
-#             if file == 'B27010':
-#                 df = df[df['TITLE'].isin(hc)]
-#                 appended_data.append(df)
-#             else:
-#                 df = df.iloc[2:]
-#                 appended_data.append(df)
-            
-#         except zipfile.BadZipFile as err:
-#             continue
-#         print("Successfully loaded state FIPS code " + str(state_num))
-            
-              
-#     vre_concat = pd.concat(appended_data) 
-#     vre_df_list.append(vre_concat)
-
-
-
-# ### 11. create EJ metrics of my own - percentages with aggregation required (VRE table method)
-# hlth = vre_df_list[0]
-
-# # total pop under 19 y/o
-# undr19yo = hlth[(hlth['ORDER'] == 2.0)] # all ppl under 19 y/os
-# undr19yo_bgs = undr19yo[['GEOID','ESTIMATE']]
-
-# # under 19 y/o: healthcare groups of interest
-# undr19yohc = hlth[(hlth['ORDER'] == 6.0) | # 19 y/os: medicare coverage only
-#                 (hlth['ORDER'] == 7.0) | # 19 y/os: medicaid/means-tested public coverage only
-#                 (hlth['ORDER'] == 17.0)] # 19 y/os: uninsured
-
-# # sum estimates by GEOID and merge to new df
-# hc_df = undr19yo_bgs.merge(undr19yohc, on = 'GEOID', how = 'right')
-# hc_df.head(n=5)
-# # sum MOEs
-# #undr19yo
-# #for blockgroup in geoid:
-# #    estimate = renter_ratio['ESTIMATE']
-# #    for i in range(1,81):
-# #        col_name = "Var_Rep" + str(i)
-# #        var_rep = renter_ratio.groupby('GEOID')[col_name].sum()['Renter occupied:']
-# #        sq_diff = pow((var_rep - estimate), 2)
-# #        st_err = math.sqrt(sum(sq_diff) * (4/80))
-# #        moe = st_err * 1.645
-# #        print([blockgroup, col_name, moe])
-        
-
-